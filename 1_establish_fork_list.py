@@ -1,151 +1,63 @@
 import json
-import os
-import pprint
-import re
-import requests
-import time
-from util import acquire_node
-from util import github_rate_limit
+from concurrent.futures import FIRST_EXCEPTION
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from forges import init_forges
 from util import node_uid
 
 
-API_cache_location = 'api_cache'
-
-
-def url_to_cache_name(url):
-    return os.path.join(API_cache_location, re.sub('[://\.?=]', ',', url))
-
-
-def check_for_API_cache(url):
-    path = url_to_cache_name(url)
-    if os.path.exists(path):
-        f = open(path, 'r')
-        return_package = json.loads(f.read())
-        f.close()
-        return return_package
-    else:
-        return None
-
-
-def write_API_cache(url, data_package):
-    path = url_to_cache_name(url)
-    f = open(path, 'w')
-    f.write(json.dumps(data_package))
-    f.close()
-
-
-def retreive_api_page(url, default_wait_time=github_rate_limit, read_cache=True, write_cache=True):
-    # retrieves a single API page, parses the GET, and returns select data
-
-    # check for cached value first
-    if read_cache:
-        cached_data = check_for_API_cache(url)
-        if cached_data:
-            return cached_data
-
-    # no cached value, retrieve fresh data
-    print(f'{time.time():<20} retrieving {url}')
-    ret = requests.get(url)
-
-    assert ret.status_code == 200
-
-    # convert primary data package to json
-    try:
-        data_package = ret.json()
-    except:
-        print('failed json conversion', url)
-        print('status_code:', ret.status_code)
-        print('headers:')
-        pprint.pprint(dict(ret.headers))
-        print()
-        print('text:', ret.text)
-
-    return_package = (data_package, ret.links)
-
-    # store cached data for later retrieval
-    if write_cache:
-        write_API_cache(url, return_package)
-
-    # rate limit
-    # check specifications from response headers
-    headers = ret.headers
-    rate_limit_remaining = int(headers['X-RateLimit-Remaining'])
-    rate_limit_reset = int(headers['X-RateLimit-Reset'])
-    if time.time() < rate_limit_reset:
-        wait_time = 1 + (rate_limit_reset - time.time()) / rate_limit_remaining
-    else:
-        wait_time = default_wait_time
-
-    print(f'{time.time():<20} waiting {wait_time} seconds')
-    time.sleep(wait_time)
-
-    return return_package
-
-
-def retrieve_repo_forks(url):
-    # retrieves all forks for a single repo, distributed over several API calls
-
-    forks, links = retreive_api_page(url)
-    while 'next' in links:
-        _forks, links = retreive_api_page(links['next']['url'])
-        forks.extend(_forks)
-
-    return forks
-
-
-def retrieve_recursive_forks_from_api_package(api_package):
+def retrieve_recursive_forks_from_api_package(forge, api_package):
     # constructs tree data for base repo, recursively traversing all forks
     # requires API package as input, see below function for entry point with only a repo description
+    # forks_count is None for forges which do not report it, so forks are retrieved regardless
 
     tree_data = {'api_package': api_package,
                  'forks': []}
 
     # retrieve recursive data packages, and construct tree data
-    if api_package['forks_count'] > 0:
-        forks_url = api_package['forks_url']
-        forks_api_packages = retrieve_repo_forks(forks_url)
+    if api_package['forks_count'] != 0:
+        forks_api_packages = forge.retrieve_repo_forks(api_package)
 
         for fork_api_package in forks_api_packages:
-            tree_data['forks'].append(retrieve_recursive_forks_from_api_package(fork_api_package))
+            tree_data['forks'].append(retrieve_recursive_forks_from_api_package(forge, fork_api_package))
 
     return tree_data
 
 
-def retrieve_recursive_forks_from_repo_description(user_name, repo_name):
+def retrieve_recursive_forks_from_repo_description(forge, user_name, repo_name):
     # entry level function for constructing tree data for base repo
 
-    url = f'https://api.github.com/repos/{user_name}/{repo_name}'
-    api_package, links = retreive_api_page(url)
+    api_package = forge.retrieve_repo(user_name, repo_name)
 
-    return retrieve_recursive_forks_from_api_package(api_package)
+    return retrieve_recursive_forks_from_api_package(forge, api_package)
 
 
-def find_tree_node(base_tree, parent_user_name, parent_repo_name):
+def find_tree_node(base_tree, parent_forge_name, parent_user_name, parent_repo_name):
     # finds node in base_tree
     # returns None if specified node not found in base_tree
 
     current_uid = node_uid(base_tree)
-    parent_uid = (parent_user_name, parent_repo_name)
+    parent_uid = (parent_forge_name, parent_user_name, parent_repo_name)
 
     if current_uid == parent_uid:
         return [current_uid]
 
     for fork in base_tree['forks']:
-        sub_location = find_tree_node(fork, parent_user_name, parent_repo_name)
+        sub_location = find_tree_node(fork, parent_forge_name, parent_user_name, parent_repo_name)
         if sub_location is not None:
             return [current_uid] + sub_location
 
     return None
 
 
-def insert_tree_data(base_tree, child_tree, parent_user_name, parent_repo_name):
+def insert_tree_data(base_tree, child_tree, parent_forge_name, parent_user_name, parent_repo_name):
     # inserts child_tree into base_tree at specified parent
     # requires parent to exist in base_tree
     # returns modified base_tree
 
     # acquire insertion_location
-    insertion_location = find_tree_node(base_tree, parent_user_name, parent_repo_name)
-    assert insertion_location is not None, (parent_user_name, parent_repo_name)
+    insertion_location = find_tree_node(base_tree, parent_forge_name, parent_user_name, parent_repo_name)
+    assert insertion_location is not None, (parent_forge_name, parent_user_name, parent_repo_name)
 
     # location should always begin with tree root, which we do not need to search for
     base_uid = node_uid(base_tree)
@@ -170,80 +82,134 @@ def insert_tree_data(base_tree, child_tree, parent_user_name, parent_repo_name):
     return base_tree
 
 
-def manually_link_tree_data(user_name, repo_name, parent_user_name, parent_repo_name, tree_data):
-    # manually links a repo to a parent repo
-    # looks up api package for given repo and inserts into tree data
-    # requires parent repo to exist (anywhere) in tree_data
+def crawl_forge(forge, links, root=None):
+    # retrieves child trees for the manual links hosted on a single forge, in link order
+    # optionally retrieves the root tree first
+    # skips links whose repo already exists in the root or a previously retrieved child tree
+    #   forks never cross forges, so trees from other forges need not be searched
+    # returns the root tree (or None) and a dict of child trees keyed by link index
+
+    known_trees = []
+    root_tree = None
+    if root is not None:
+        root_user_name, root_repo_name = root
+        root_tree = retrieve_recursive_forks_from_repo_description(forge, root_user_name, root_repo_name)
+        known_trees.append(root_tree)
+
+    child_trees = {}
+    for i_link, (user_name, repo_name, *parent_uid) in links:
+        if all(find_tree_node(tree, forge.name, user_name, repo_name) is None for tree in known_trees):
+            child_tree = retrieve_recursive_forks_from_repo_description(forge, user_name, repo_name)
+            known_trees.append(child_tree)
+            child_trees[i_link] = child_tree
+
+    return root_tree, child_trees
+
+
+def crawl_network(forges, root, links):
+    # constructs tree data for the root repo and all manually linked repos
+    # root is (forge_name, user_name, repo_name)
+    # links are (forge_name, user_name, repo_name, parent_forge_name, parent_user_name, parent_repo_name)
+    #   a link's parent may be hosted on any forge, but must exist in the tree before the link, in link order
+    # forges are crawled concurrently, each restricted by its own rate limiter
+    #   if any forge's crawl fails, the others are cancelled and the error raised immediately
+    # child trees are then inserted sequentially, in link order
+
+    root_forge_name, root_user_name, root_repo_name = root
+
+    # group links by forge, remembering their global order
+    forge_links = {forge_name: [] for forge_name in forges}
+    for i_link, (forge_name, *link) in enumerate(links):
+        forge_links[forge_name].append((i_link, link))
+
+    with ThreadPoolExecutor(max_workers=len(forges)) as executor:
+        futures = {}
+        for forge_name, forge in forges.items():
+            forge_root = (root_user_name, root_repo_name) if forge_name == root_forge_name else None
+            futures[forge_name] = executor.submit(crawl_forge, forge, forge_links[forge_name], forge_root)
+
+        done, not_done = wait(futures.values(), return_when=FIRST_EXCEPTION)
+        for future in done:
+            if future.exception() is not None:
+                for forge in forges.values():
+                    forge.cancel()
+                raise future.exception()
+
+        results = {forge_name: future.result() for forge_name, future in futures.items()}
+
+    tree_data, _ = results[root_forge_name]
+    child_trees = {}
+    for _, forge_child_trees in results.values():
+        child_trees.update(forge_child_trees)
 
-    # check if node already exists in tree
-    if find_tree_node(tree_data, user_name, repo_name) is None:
-        # create a new child tree for non-existent node, and insert it into the correct location in the tree
-        child_tree = retrieve_recursive_forks_from_repo_description(user_name, repo_name)
-        tree_data = insert_tree_data(tree_data, child_tree, parent_user_name, parent_repo_name)
+    # insert tree data
+    for i_link, (forge_name, user_name, repo_name, *parent_uid) in enumerate(links):
+        if i_link in child_trees:
+            tree_data = insert_tree_data(tree_data, child_trees[i_link], *parent_uid)
 
     return tree_data
 
 
-# 'watchers_count'
-
 if __name__ == '__main__':
     # collected manual links from https://pixeldungeon.fandom.com/wiki/Category:Mods on Mar-03-2022
 
-    tree_data = retrieve_recursive_forks_from_repo_description('watabou', 'pixel-dungeon')
-    tree_data = manually_link_tree_data('00-Evan', 'shattered-pixel-dungeon', 'watabou', 'pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('dachhack', 'SproutedPixelDungeon', '00-Evan', 'shattered-pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('hmdzl001', 'SPS-PD', 'dachhack', 'SproutedPixelDungeon', tree_data)
-    tree_data = manually_link_tree_data('ConsideredHamster', 'YetAnotherPixelDungeon', 'watabou', 'pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('egoal', 'darkest-pixel-dungeon', '00-Evan', 'shattered-pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('HappyAlfred', 'fushigi-no-pixel-dungeon', '00-Evan', 'shattered-pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('3oiDburg', 'WuWuWu', '00-Evan', 'shattered-pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('rodriformiga', 'pixel-dungeon', 'watabou', 'pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('NYRDS', 'remixed-dungeon', 'rodriformiga', 'pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('pseusys', 'PXL610', 'watabou', 'pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('Smujb', 'powered-pixel-dungeon', '00-Evan', 'shattered-pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('Smujb', 'cursed-pixel-dungeon', 'Smujb', 'powered-pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('BrightBotTeam', 'DeisticPixelDungeon', 'dachhack', 'SproutedPixelDungeon', tree_data)
-    tree_data = manually_link_tree_data('Arcnor', 'pixel-dungeon-gdx', 'watabou', 'pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('arfonzocoward', 'dixel-pungeon', 'watabou', 'pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('G2159687', 'ESPD', 'dachhack', 'SproutedPixelDungeon', tree_data)
-    tree_data = manually_link_tree_data('G2159687', 'Easier-Vanilla-Pixel-Dungeon', 'watabou', 'pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('TrashboxBobylev', 'experienced-pixel-dungeon', '00-Evan', 'shattered-pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('TrashboxBobylev', 'Experienced-Pixel-Dungeon-Redone', '00-Evan', 'shattered-pixel-dungeon', tree_data)  # play this
-    tree_data = manually_link_tree_data('Sharku2011', 'GirlsFrontline-pixel-dungeon', '00-Evan', 'shattered-pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('FthrNature', 'unleashed-pixel-dungeon', '00-Evan', 'shattered-pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('locastan', 'GoblinsPixelDungeonGradle', 'FthrNature', 'unleashed-pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('Smujb', 'harder-sprouted-pd', 'dachhack', 'SproutedPixelDungeon', tree_data)
-    tree_data = manually_link_tree_data('afomins', 'pixel-dungeon-3d', 'watabou', 'pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('Zrp200', 'lustrous-pixel-dungeon', '00-Evan', 'shattered-pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('Meduris', 'MinecraftPixelDungeon', '00-Evan', 'shattered-pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('ndachel', 'PD-ice', '00-Evan', 'shattered-pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('Meduris', 'german-pixel-dungeon', 'watabou', 'pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('AnonymousPD', 'OvergrownPixelDungeon', '00-Evan', 'shattered-pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('AnonymousPD', 'OvergrownPD', '00-Evan', 'shattered-pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('bilbolPrime', 'SPD', 'watabou', 'pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('etoitau', 'Pixel-Dungeon-Echo', 'bilbolPrime', 'SPD', tree_data)
-    tree_data = manually_link_tree_data('gohjohn', 'phoenix-pixel-dugeon', 'watabou', 'pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('lighthouse64', 'Random-Dungeon', 'watabou', 'pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('cuneytoner', 'PixelDungeonRemake', 'NYRDS', 'remixed-dungeon', tree_data)
-    tree_data = manually_link_tree_data('QuasiStellar', 'Re-Remixed_Dungeon', '00-Evan', 'shattered-pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('umarnobbee', 'Ripped-Pixel-Dungeon', 'watabou', 'pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('MarshalldotEXE', 'rivals-pixel-dungeon', '00-Evan', 'shattered-pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('wolispace', 'soft-pixel-dungeon', '00-Evan', 'shattered-pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('TrashboxBobylev', 'Summoning-Pixel-Dungeon', '00-Evan', 'shattered-pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('CuteLunaMoon', 'Survival-Pixel-Dungeon', '00-Evan', 'shattered-pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('juh9870', 'TooCruelPixelDungeon', '00-Evan', 'shattered-pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('keithr-git', 'tunable-pixel-dungeon', 'watabou', 'pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('mango-tree', 'UNIST-pixel-dungeon', '00-Evan', 'shattered-pixel-dungeon', tree_data)
-    tree_data = manually_link_tree_data('FthrNature', 'unleashed-pixel-dungeon', '00-Evan', 'shattered-pixel-dungeon', tree_data)
-
-    # TODO implement gitlab APIs 
-    # https://pixeldungeon.fandom.com/wiki/No_Name_Yet_Pixel_Dungeon#Overview 
-    #   https://gitlab.com/RavenWolfPD/nonameyetpixeldungeon
-    #   tree_data = manually_link_tree_data('RavenWolfPD', 'nonameyetpixeldungeon', 'ConsideredHamster', 'YetAnotherPixelDungeon', tree_data)
-
-    # TODO implement bitbucket APIs
-    # https://pixeldungeon.fandom.com/wiki/Moonshine_Pixel_Dungeon
-    #   https://bitbucket.org/juh9870/moonshine/src/master/
+    forges = init_forges()
+    root = ('github', 'watabou', 'pixel-dungeon')
+    links = [
+        ('github', '00-Evan', 'shattered-pixel-dungeon', 'github', 'watabou', 'pixel-dungeon'),
+        ('github', 'dachhack', 'SproutedPixelDungeon', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+        ('github', 'hmdzl001', 'SPS-PD', 'github', 'dachhack', 'SproutedPixelDungeon'),
+        ('github', 'ConsideredHamster', 'YetAnotherPixelDungeon', 'github', 'watabou', 'pixel-dungeon'),
+        ('github', 'egoal', 'darkest-pixel-dungeon', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+        ('github', 'HappyAlfred', 'fushigi-no-pixel-dungeon', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+        ('github', '3oiDburg', 'WuWuWu', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+        ('github', 'rodriformiga', 'pixel-dungeon', 'github', 'watabou', 'pixel-dungeon'),
+        ('github', 'NYRDS', 'remixed-dungeon', 'github', 'rodriformiga', 'pixel-dungeon'),
+        ('github', 'pseusys', 'PXL610', 'github', 'watabou', 'pixel-dungeon'),
+        ('github', 'Smujb', 'powered-pixel-dungeon', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+        ('github', 'Smujb', 'cursed-pixel-dungeon', 'github', 'Smujb', 'powered-pixel-dungeon'),
+        ('github', 'BrightBotTeam', 'DeisticPixelDungeon', 'github', 'dachhack', 'SproutedPixelDungeon'),
+        ('github', 'Arcnor', 'pixel-dungeon-gdx', 'github', 'watabou', 'pixel-dungeon'),
+        ('github', 'arfonzocoward', 'dixel-pungeon', 'github', 'watabou', 'pixel-dungeon'),
+        ('github', 'G2159687', 'ESPD', 'github', 'dachhack', 'SproutedPixelDungeon'),
+        ('github', 'G2159687', 'Easier-Vanilla-Pixel-Dungeon', 'github', 'watabou', 'pixel-dungeon'),
+        ('github', 'TrashboxBobylev', 'experienced-pixel-dungeon', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+        ('github', 'TrashboxBobylev', 'Experienced-Pixel-Dungeon-Redone', 'github', '00-Evan', 'shattered-pixel-dungeon'),  # play this
+        ('github', 'Sharku2011', 'GirlsFrontline-pixel-dungeon', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+        ('github', 'FthrNature', 'unleashed-pixel-dungeon', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+        ('github', 'locastan', 'GoblinsPixelDungeonGradle', 'github', 'FthrNature', 'unleashed-pixel-dungeon'),
+        ('github', 'Smujb', 'harder-sprouted-pd', 'github', 'dachhack', 'SproutedPixelDungeon'),
+        ('github', 'afomins', 'pixel-dungeon-3d', 'github', 'watabou', 'pixel-dungeon'),
+        ('github', 'Zrp200', 'lustrous-pixel-dungeon', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+        ('github', 'Meduris', 'MinecraftPixelDungeon', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+        ('github', 'ndachel', 'PD-ice', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+        ('github', 'Meduris', 'german-pixel-dungeon', 'github', 'watabou', 'pixel-dungeon'),
+        ('github', 'AnonymousPD', 'OvergrownPixelDungeon', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+        ('github', 'AnonymousPD', 'OvergrownPD', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+        ('github', 'bilbolPrime', 'SPD', 'github', 'watabou', 'pixel-dungeon'),
+        ('github', 'etoitau', 'Pixel-Dungeon-Echo', 'github', 'bilbolPrime', 'SPD'),
+        ('github', 'gohjohn', 'phoenix-pixel-dugeon', 'github', 'watabou', 'pixel-dungeon'),
+        ('github', 'lighthouse64', 'Random-Dungeon', 'github', 'watabou', 'pixel-dungeon'),
+        ('github', 'cuneytoner', 'PixelDungeonRemake', 'github', 'NYRDS', 'remixed-dungeon'),
+        ('github', 'QuasiStellar', 'Re-Remixed_Dungeon', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+        ('github', 'umarnobbee', 'Ripped-Pixel-Dungeon', 'github', 'watabou', 'pixel-dungeon'),
+        ('github', 'MarshalldotEXE', 'rivals-pixel-dungeon', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+        ('github', 'wolispace', 'soft-pixel-dungeon', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+        ('github', 'TrashboxBobylev', 'Summoning-Pixel-Dungeon', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+        ('github', 'CuteLunaMoon', 'Survival-Pixel-Dungeon', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+        ('github', 'juh9870', 'TooCruelPixelDungeon', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+        ('github', 'keithr-git', 'tunable-pixel-dungeon', 'github', 'watabou', 'pixel-dungeon'),
+        ('github', 'mango-tree', 'UNIST-pixel-dungeon', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+        ('github', 'FthrNature', 'unleashed-pixel-dungeon', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+
+        # https://pixeldungeon.fandom.com/wiki/No_Name_Yet_Pixel_Dungeon#Overview
+        ('gitlab', 'RavenWolfPD', 'nonameyetpixeldungeon', 'github', 'ConsideredHamster', 'YetAnotherPixelDungeon'),
+
+        # https://pixeldungeon.fandom.com/wiki/Moonshine_Pixel_Dungeon
+        ('bitbucket', 'juh9870', 'moonshine', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+    ]
+
+    tree_data = crawl_network(forges, root, links)
 
     # source code not available
     # https://pixeldungeon.fandom.com/wiki/Dungeon_Run_WIP
@@ -6,18 +6,18 @@ from util import clone_folder_path
 from util import node_uid
 
 
-def delete_node(tree, user_name, repo_name):
+def delete_node(tree, forge_name, user_name, repo_name):
     # removes a node from the tree (if it exists), other than the root node
     # TODO refactor to use acquire_node
 
-    target_uid = (user_name, repo_name)
+    target_uid = (forge_name, user_name, repo_name)
 
     for i_fork, fork in enumerate(tree['forks']):
         if node_uid(fork) == target_uid:
             del tree['forks'][i_fork]
             return tree
 
-        tree = delete_node(fork, user_name, repo_name)
+        tree = delete_node(fork, forge_name, user_name, repo_name)
 
     return tree
 
@@ -132,6 +132,10 @@ def comit_bio(node, commit):
     name = node['api_package']['full_name']
     watchers = node['api_package']['watchers_count']
 
+    # some forges do not report watcher counts
+    if watchers is None:
+        return f'{name}\n{commit}'
+
     return f'{name}\n{watchers} watchers\n{commit}'
 
 
@@ -0,0 +1,182 @@
+import json
+import numpy as np
+from operator import itemgetter
+from util import node_uid
+
+
+# bucket widths, as numpy datetime units, with the shift in days applied before bucketing
+# numpy counts weeks from the epoch, a thursday, so timestamps are shifted 3 days forward for weeks to start on mondays
+periods = {'week': ('W', 3),
+           'month': ('M', 0)}
+
+
+def flatten_tree(tree, parent_index=-1, nodes=None, parents=None):
+    # lists all nodes in preorder, alongside the index of each node's parent (-1 for the root)
+    # preorder guarantees every parent index is lower than the indices of its forks
+
+    if nodes is None:
+        nodes = []
+        parents = []
+
+    index = len(nodes)
+    nodes.append(tree)
+    parents.append(parent_index)
+
+    for fork in tree['forks']:
+        flatten_tree(fork, index, nodes, parents)
+
+    return nodes, parents
+
+
+def hash_keys(history):
+    # reduces commit hashes to their leading 64 bits, which compare far faster than strings
+    # collisions are negligible at this scale (~1e-7 chance across millions of commits)
+    return np.fromiter((int(commit_hash[:16], 16) for timestamp, commit_hash in history), dtype=np.uint64, count=len(history))
+
+
+def contains(sorted_keys, keys):
+    # vectorized membership test of keys (hashes or timestamps) against an already sorted array
+    if sorted_keys.size == 0:
+        return np.zeros(keys.size, dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_keys, keys), sorted_keys.size - 1)
+    return sorted_keys[positions] == keys
+
+
+def load_histories(nodes):
+    # loads each node's commit timestamps and hash keys into numpy arrays
+    # nodes which were not cloned have empty histories
+
+    timestamp_arrays = []
+    hash_arrays = []
+    for node in nodes:
+        history = node.get('commit_history') or []
+        timestamp_arrays.append(np.fromiter(map(itemgetter(0), history), dtype=np.int64, count=len(history)))
+        hash_arrays.append(hash_keys(history))
+
+    return timestamp_arrays, hash_arrays
+
+
+def fallback_cutoff(sorted_parent_timestamps, timestamps):
+    # mirrors stage 3's fallback for forks sharing no commits with their parent
+    # returns the timestamp of the latest parent commit still prior to the fork's first commit, or None if there is none
+
+    if timestamps.size == 0:
+        return None
+    position = np.searchsorted(sorted_parent_timestamps, timestamps.min(), side='right') - 1
+    if position < 0:
+        return None
+    return sorted_parent_timestamps[position]
+
+
+def load_post_fork_timestamps(nodes, parents):
+    # loads the timestamps of every node's own commits into one flat array, alongside the node index of each commit
+    # a commit is a node's own if its hash is absent from its parent's history
+    #   this drops commits inherited at the fork and upstream commits merged in later,
+    #   while keeping the fork's commits dated before such a merge
+    # if the fork shares no hashes with its parent, its history was rewritten, so timestamps are compared instead
+    #   commits at or before stage 3's fallback branch point are dropped
+    #   as are commits whose timestamps match a parent commit, since rewriting preserves author timestamps
+    #   the branch point never follows the fork's first commit, so the timestamp match removes most of the copied history
+    # where the parent was not cloned, the nearest ancestor with a history is compared against instead
+    # the root node has no parent, so all of its commits count
+
+    timestamp_arrays, hash_arrays = load_histories(nodes)
+    own_timestamp_arrays = list(timestamp_arrays)
+
+    # each ancestor's history is sorted once, however many forks are compared against it
+    sorted_hash_arrays = {}
+    sorted_timestamp_arrays = {}
+
+    for index in range(1, len(nodes)):
+        ancestor = parents[index]
+        while ancestor != -1 and hash_arrays[ancestor].size == 0:
+            ancestor = parents[ancestor]
+
+        if ancestor == -1:
+            continue
+
+        if ancestor not in sorted_hash_arrays:
+            sorted_hash_arrays[ancestor] = np.sort(hash_arrays[ancestor])
+        shared = contains(sorted_hash_arrays[ancestor], hash_arrays[index])
+
+        if shared.any():
+            own = ~shared
+        else:
+            if ancestor not in sorted_timestamp_arrays:
+                sorted_timestamp_arrays[ancestor] = np.sort(timestamp_arrays[ancestor])
+            sorted_parent_timestamps = sorted_timestamp_arrays[ancestor]
+
+            own = ~contains(sorted_parent_timestamps, timestamp_arrays[index])
+            cutoff = fallback_cutoff(sorted_parent_timestamps, timestamp_arrays[index])
+            if cutoff is not None:
+                own &= timestamp_arrays[index] > cutoff
+
+        own_timestamp_arrays[index] = timestamp_arrays[index][own]
+
+    lengths = np.array([len(timestamps) for timestamps in own_timestamp_arrays], dtype=np.int64)
+    timestamps = np.concatenate(own_timestamp_arrays)
+    node_indices = np.repeat(np.arange(len(nodes)), lengths)
+
+    return timestamps, node_indices
+
+
+def bucket_activity(timestamps, node_indices, n_nodes, unit, shift_days=0):
+    # counts commits per node per period, returning a (n_nodes, n_buckets) matrix and the start date of each bucket
+    # buckets span contiguously from the earliest to the latest commit across all nodes
+
+    if timestamps.size == 0:
+        return np.zeros((n_nodes, 0), dtype=np.uint32), np.array([], dtype='datetime64[D]')
+
+    shifted = timestamps + shift_days * 86400
+    buckets = shifted.astype('datetime64[s]').astype(f'datetime64[{unit}]')
+    first_bucket = buckets.min()
+    offsets = (buckets - first_bucket).astype(np.int64)
+    n_buckets = int(offsets.max()) + 1
+
+    counts = np.bincount(node_indices * n_buckets + offsets, minlength=n_nodes * n_buckets)
+    counts = counts.reshape(n_nodes, n_buckets).astype(np.uint32)
+    bucket_starts = (first_bucket + np.arange(n_buckets)).astype('datetime64[D]') - np.timedelta64(shift_days, 'D')
+
+    return counts, bucket_starts
+
+
+def subtree_activity(repo_counts, parents):
+    # sums each node's activity with the activity of all of its forks (recursive)
+    # walks nodes in reverse preorder, so each fork is complete before being added to its parent
+
+    subtree_counts = repo_counts.copy()
+    for index in range(len(parents) - 1, 0, -1):
+        subtree_counts[parents[index]] += subtree_counts[index]
+
+    return subtree_counts
+
+
+def activity_timeline(tree, period_name):
+    # aggregates post-fork commit activity per repo and per subtree
+    # returns columns suitable for saving with numpy
+
+    unit, shift_days = periods[period_name]
+    nodes, parents = flatten_tree(tree)
+    timestamps, node_indices = load_post_fork_timestamps(nodes, parents)
+    repo_counts, bucket_starts = bucket_activity(timestamps, node_indices, len(nodes), unit, shift_days)
+
+    return {'repo_names': np.array([','.join(node_uid(node)) for node in nodes]),
+            'parents': np.array(parents, dtype=np.int32),
+            'bucket_starts': bucket_starts,
+            'repo_counts': repo_counts,
+            'subtree_counts': subtree_activity(repo_counts, parents)}
+
+
+def main():
+    f = open('fork_tree_data_3.json', 'r')
+    tree = json.loads(f.read())
+    f.close()
+
+    # save one activity matrix per period, eg for heatmap rendering
+    for period_name in periods:
+        timeline = activity_timeline(tree, period_name)
+        np.savez_compressed(f'activity_timeline_{period_name}.npz', **timeline)
+
+
+if __name__ == '__main__':
+    main()
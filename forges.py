@@ -0,0 +1,247 @@
+import json
+import os
+import pprint
+import re
+import requests
+import threading
+import time
+from util import github_rate_limit
+
+
+API_cache_location = 'api_cache'
+
+
+def url_to_cache_name(url):
+    return os.path.join(API_cache_location, re.sub('[://\.?=]', ',', url))
+
+
+def check_for_API_cache(url):
+    path = url_to_cache_name(url)
+    if os.path.exists(path):
+        f = open(path, 'r')
+        return_package = json.loads(f.read())
+        f.close()
+        return return_package
+    else:
+        return None
+
+
+def write_API_cache(url, data_package):
+    path = url_to_cache_name(url)
+    f = open(path, 'w')
+    f.write(json.dumps(data_package))
+    f.close()
+
+
+class Forge:
+    # adapter for a single git hosting service
+    # converts the host's repo and fork listings into the common api_package shape used by the tree
+    #   the common shape is the subset of github's repo payload read by later stages, plus the forge name
+    #   forks_count is None where the host does not report it, in which case forks are always retrieved
+    # each forge owns a session (connection pool) and a rate limit policy
+    #   a forge is crawled by a single thread, which waits out the rate limit after each fresh request
+    #   cancelling interrupts the wait, and fails the next fresh request
+    #   different forges may be crawled concurrently
+    # all forges share the same API cache, keyed by url
+    # api_root may be pointed at a local mock server for testing, with caching and waits disabled
+
+    name = None
+    default_api_root = None
+    default_wait_time = github_rate_limit
+
+    # rate limit feedback headers, None where the host does not provide them
+    remaining_header = None
+    reset_header = None
+
+    def __init__(self, api_root=None, default_wait_time=None, read_cache=True, write_cache=True):
+        self.api_root = (api_root or self.default_api_root).rstrip('/')
+        if default_wait_time is not None:
+            self.default_wait_time = default_wait_time
+        self.read_cache = read_cache
+        self.write_cache = write_cache
+
+        self.session = requests.Session()
+
+        # set to abandon a crawl in progress, eg when another forge's crawl has failed
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def repo_url(self, user_name, repo_name):
+        raise NotImplementedError
+
+    def normalize_repo(self, payload):
+        raise NotImplementedError
+
+    def forks_url(self, api_package):
+        # every adapter stores the first page of its fork listing while normalizing
+        return api_package['forks_url']
+
+    def page_items(self, payload):
+        return payload
+
+    def next_page_url(self, payload, links):
+        if 'next' in links:
+            return links['next']['url']
+        return None
+
+    def wait_time(self, headers):
+        # derives wait time before the next request from response headers, falling back to the default
+        if self.remaining_header is None or self.remaining_header not in headers or self.reset_header not in headers:
+            return self.default_wait_time
+
+        rate_limit_remaining = int(headers[self.remaining_header])
+        rate_limit_reset = int(headers[self.reset_header])
+        if time.time() < rate_limit_reset:
+            return 1 + (rate_limit_reset - time.time()) / max(rate_limit_remaining, 1)
+        else:
+            return self.default_wait_time
+
+    def retreive_api_page(self, url):
+        # retrieves a single API page, parses the GET, and returns (data, links)
+
+        # check for cached value first
+        if self.read_cache:
+            cached_data = check_for_API_cache(url)
+            if cached_data:
+                return cached_data
+
+        if self.cancelled.is_set():
+            raise RuntimeError(f'{self.name} crawl cancelled')
+
+        # no cached value, retrieve fresh data
+        print(f'{time.time():<20} [{self.name}] retrieving {url}')
+        ret = self.session.get(url)
+
+        assert ret.status_code == 200, (url, ret.status_code)
+
+        # convert primary data package to json
+        try:
+            data_package = ret.json()
+        except:
+            print('failed json conversion', url)
+            print('status_code:', ret.status_code)
+            print('headers:')
+            pprint.pprint(dict(ret.headers))
+            print()
+            print('text:', ret.text)
+            raise
+
+        return_package = (data_package, ret.links)
+
+        # store cached data for later retrieval
+        if self.write_cache:
+            write_API_cache(url, return_package)
+
+        # rate limit
+        wait_time = self.wait_time(ret.headers)
+        print(f'{time.time():<20} [{self.name}] waiting {wait_time} seconds')
+        self.cancelled.wait(wait_time)
+
+        return return_package
+
+    def retrieve_repo(self, user_name, repo_name):
+        # retrieves the api package for a single repo
+        payload, links = self.retreive_api_page(self.repo_url(user_name, repo_name))
+        return self.normalize_repo(payload)
+
+    def retrieve_repo_forks(self, api_package):
+        # retrieves api packages for all forks of a single repo, distributed over several API calls
+
+        payload, links = self.retreive_api_page(self.forks_url(api_package))
+        forks = list(self.page_items(payload))
+        next_url = self.next_page_url(payload, links)
+        while next_url is not None:
+            payload, links = self.retreive_api_page(next_url)
+            forks.extend(self.page_items(payload))
+            next_url = self.next_page_url(payload, links)
+
+        return [self.normalize_repo(fork) for fork in forks]
+
+
+class GitHub(Forge):
+    # github payloads already have the common shape
+    # pagination via Link headers
+
+    name = 'github'
+    default_api_root = 'https://api.github.com'
+    remaining_header = 'X-RateLimit-Remaining'
+    reset_header = 'X-RateLimit-Reset'
+
+    def repo_url(self, user_name, repo_name):
+        return f'{self.api_root}/repos/{user_name}/{repo_name}'
+
+    def normalize_repo(self, payload):
+        api_package = dict(payload)
+        api_package['forge'] = self.name
+        return api_package
+
+
+class GitLab(Forge):
+    # projects are addressed by url-encoded path or numeric id
+    # pagination via Link headers
+
+    name = 'gitlab'
+    default_api_root = 'https://gitlab.com/api/v4'
+    default_wait_time = 1
+    remaining_header = 'RateLimit-Remaining'
+    reset_header = 'RateLimit-Reset'
+
+    def repo_url(self, user_name, repo_name):
+        project_path = requests.utils.quote(f'{user_name}/{repo_name}', safe='')
+        return f'{self.api_root}/projects/{project_path}'
+
+    def normalize_repo(self, payload):
+        return {'forge': self.name,
+                'id': payload['id'],
+                'name': payload['path'],
+                'full_name': payload['path_with_namespace'],
+                'owner': {'login': payload['namespace']['full_path']},
+                'html_url': payload['web_url'],
+                'clone_url': payload['http_url_to_repo'],
+                'watchers_count': payload['star_count'],
+                'forks_count': payload['forks_count'],
+                'forks_url': f"{self.api_root}/projects/{payload['id']}/forks?per_page=100"}
+
+
+class Bitbucket(Forge):
+    # repos are addressed by workspace and slug
+    # pagination via 'next' urls in the response body, items under 'values'
+    # no rate limit feedback headers, so requests are spaced by the default wait time
+
+    name = 'bitbucket'
+    default_api_root = 'https://api.bitbucket.org/2.0'
+    default_wait_time = 4  # anonymous limit is 1000 requests per hour
+
+    def repo_url(self, user_name, repo_name):
+        return f'{self.api_root}/repositories/{user_name}/{repo_name}'
+
+    def normalize_repo(self, payload):
+        workspace, slug = payload['full_name'].split('/')
+        clone_urls = {link['name']: link['href'] for link in payload['links']['clone']}
+        return {'forge': self.name,
+                'name': slug,
+                'full_name': payload['full_name'],
+                'owner': {'login': workspace},
+                'html_url': payload['links']['html']['href'],
+                'clone_url': clone_urls['https'],
+                'watchers_count': None,
+                'forks_count': None,
+                'forks_url': payload['links']['forks']['href'] + '?pagelen=100'}
+
+    def page_items(self, payload):
+        return payload['values']
+
+    def next_page_url(self, payload, links):
+        return payload.get('next')
+
+
+forge_classes = {forge_class.name: forge_class for forge_class in [GitHub, GitLab, Bitbucket]}
+
+
+def init_forges(**forge_settings):
+    # constructs one adapter per known forge
+    # settings may be overridden by forge name, as a dict of constructor arguments
+    #   eg github={'api_root': mock_url, 'default_wait_time': 0, 'read_cache': False, 'write_cache': False}
+    return {name: forge_class(**forge_settings.get(name, {})) for name, forge_class in forge_classes.items()}
@@ -0,0 +1,116 @@
+import hashlib
+import importlib.util
+import numpy as np
+import os
+import unittest
+
+
+# stage scripts start with a digit, so are loaded by path
+spec = importlib.util.spec_from_file_location('activity_timeline', os.path.join(os.path.dirname(__file__), '5_activity_timeline.py'))
+activity_timeline = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(activity_timeline)
+
+
+day = 86400
+monday = 1704067200  # 2024-01-01
+
+
+def commit(timestamp, name):
+    # commit history entry with a realistic hash derived from a short name
+    return (timestamp, hashlib.sha1(name.encode()).hexdigest())
+
+
+def make_node(user_name, commit_history, forks=()):
+    node = {'api_package': {'forge': 'github', 'owner': {'login': user_name}, 'name': 'pixel-dungeon'},
+            'forks': list(forks)}
+    if commit_history is not None:
+        node['commit_history'] = commit_history
+    return node
+
+
+class TestActivityTimeline(unittest.TestCase):
+    def test_chain_counts_each_nodes_own_commits(self):
+        # root -> child -> grandchild, without relying on stage 3 fork points
+        root_history = [commit(monday, 'a'), commit(monday + day, 'b'), commit(monday + 2 * day, 'c')]
+        child_history = root_history[:2] + [commit(monday + 3 * day, 'x')]
+        grandchild_history = child_history + [commit(monday + 4 * day, 'y')]
+
+        grandchild = make_node('grandchild', grandchild_history)
+        child = make_node('child', child_history, [grandchild])
+        tree = make_node('root', root_history, [child])
+
+        timeline = activity_timeline.activity_timeline(tree, 'month')
+        self.assertEqual(timeline['repo_counts'].sum(axis=1).tolist(), [3, 1, 1])
+        self.assertEqual(timeline['subtree_counts'].sum(axis=1).tolist(), [5, 2, 1])
+        self.assertEqual(timeline['parents'].tolist(), [-1, 0, 1])
+        self.assertEqual(timeline['repo_names'][2], 'github,grandchild,pixel-dungeon')
+
+    def test_merged_upstream_commits_are_not_counted(self):
+        # child commits x, then merges upstream c, which moves its latest common commit past x
+        root_history = [commit(100, 'a'), commit(300, 'c')]
+        child_history = [commit(100, 'a'), commit(150, 'x'), commit(300, 'c'), commit(310, 'm')]
+        child = make_node('child', child_history)
+        tree = make_node('root', root_history, [child])
+
+        timestamps, node_indices = activity_timeline.load_post_fork_timestamps(*activity_timeline.flatten_tree(tree))
+        self.assertEqual(timestamps[node_indices == 1].tolist(), [150, 310])
+        self.assertEqual(timestamps[node_indices == 0].tolist(), [100, 300])
+
+    def test_rewritten_history_falls_back_to_timestamps(self):
+        # child copies its parent's history under new hashes, keeping author timestamps, then commits z
+        root_history = [commit(100, 'a'), commit(200, 'b'), commit(300, 'c')]
+        child_history = [commit(100, 'a2'), commit(200, 'b2'), commit(300, 'c2'), commit(400, 'z')]
+        child = make_node('child', child_history)
+        tree = make_node('root', root_history, [child])
+
+        timestamps, node_indices = activity_timeline.load_post_fork_timestamps(*activity_timeline.flatten_tree(tree))
+        self.assertEqual(timestamps[node_indices == 1].tolist(), [400])
+
+        timeline = activity_timeline.activity_timeline(tree, 'month')
+        self.assertEqual(timeline['subtree_counts'].sum(axis=1).tolist(), [4, 1])
+
+    def test_unrelated_history_keeps_commits_after_branch_point(self):
+        # child shares no hashes or timestamps with its parent, and stage 3's branch point (b at 200) precedes all its commits
+        root_history = [commit(100, 'a'), commit(200, 'b'), commit(300, 'c')]
+        child_history = [commit(250, 'p'), commit(350, 'q')]
+        child = make_node('child', child_history)
+        tree = make_node('root', root_history, [child])
+
+        timestamps, node_indices = activity_timeline.load_post_fork_timestamps(*activity_timeline.flatten_tree(tree))
+        self.assertEqual(timestamps[node_indices == 1].tolist(), [250, 350])
+
+    def test_uncloned_parent_falls_back_to_ancestor(self):
+        root_history = [commit(100, 'a'), commit(200, 'b')]
+        grandchild = make_node('grandchild', root_history + [commit(300, 'z')])
+        child = make_node('child', None, [grandchild])
+        tree = make_node('root', root_history, [child])
+
+        timeline = activity_timeline.activity_timeline(tree, 'month')
+        self.assertEqual(timeline['repo_counts'].sum(axis=1).tolist(), [2, 0, 1])
+
+    def test_weeks_start_on_monday(self):
+        # sunday 2024-01-07 shares a week with monday 2024-01-01, monday 2024-01-08 starts the next
+        timestamps = np.array([monday, monday + 2 * day, monday + 7 * day - 1, monday + 7 * day], dtype=np.int64)
+        node_indices = np.zeros(4, dtype=np.int64)
+
+        counts, bucket_starts = activity_timeline.bucket_activity(timestamps, node_indices, 1, *activity_timeline.periods['week'])
+        self.assertEqual(counts.tolist(), [[3, 1]])
+        self.assertEqual(bucket_starts.tolist(), [np.datetime64('2024-01-01').item(), np.datetime64('2024-01-08').item()])
+
+    def test_months(self):
+        timestamps = np.array([monday, monday + 40 * day, monday + 41 * day], dtype=np.int64)
+        node_indices = np.array([0, 1, 1], dtype=np.int64)
+
+        counts, bucket_starts = activity_timeline.bucket_activity(timestamps, node_indices, 2, *activity_timeline.periods['month'])
+        self.assertEqual(counts.tolist(), [[1, 0], [0, 2]])
+        self.assertEqual(bucket_starts.astype(str).tolist(), ['2024-01-01', '2024-02-01'])
+
+    def test_no_commits(self):
+        tree = make_node('root', None)
+        timeline = activity_timeline.activity_timeline(tree, 'week')
+        self.assertEqual(timeline['repo_counts'].shape, (1, 0))
+        self.assertEqual(timeline['bucket_starts'].size, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,296 @@
+import importlib.util
+import json
+import os
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from forges import init_forges
+from util import clone_folder_path
+from util import node_uid
+
+
+# stage scripts start with a digit, so are loaded by path
+spec = importlib.util.spec_from_file_location('establish_fork_list', os.path.join(os.path.dirname(__file__), '1_establish_fork_list.py'))
+establish_fork_list = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(establish_fork_list)
+
+
+# keys read by later stages from every node's api_package
+common_keys = {'forge', 'name', 'full_name', 'owner', 'html_url', 'clone_url', 'watchers_count', 'forks_count', 'forks_url'}
+
+
+class MockForge:
+    # serves canned json responses from a local http server
+    # routes map raw request paths (including query) to (payload, headers)
+
+    def __init__(self):
+        self.routes = {}
+        self.requested_paths = []
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                mock.requested_paths.append(self.path)
+                if self.path not in mock.routes:
+                    self.send_error(404)
+                    return
+
+                payload, headers = mock.routes[self.path]
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def mock_settings(mock, default_wait_time=0):
+    return {'api_root': mock.url, 'default_wait_time': default_wait_time, 'read_cache': False, 'write_cache': False}
+
+
+def github_repo(api_root, user_name, repo_name, forks_count):
+    return {'name': repo_name,
+            'full_name': f'{user_name}/{repo_name}',
+            'owner': {'login': user_name},
+            'html_url': f'https://github.com/{user_name}/{repo_name}',
+            'clone_url': f'https://github.com/{user_name}/{repo_name}.git',
+            'watchers_count': 7,
+            'forks_count': forks_count,
+            'forks_url': f'{api_root}/repos/{user_name}/{repo_name}/forks'}
+
+
+def gitlab_project(project_id, namespace, path, forks_count):
+    return {'id': project_id,
+            'path': path,
+            'path_with_namespace': f'{namespace}/{path}',
+            'namespace': {'full_path': namespace},
+            'web_url': f'https://gitlab.com/{namespace}/{path}',
+            'http_url_to_repo': f'https://gitlab.com/{namespace}/{path}.git',
+            'star_count': 3,
+            'forks_count': forks_count}
+
+
+def bitbucket_repo(api_root, workspace, slug):
+    return {'name': slug.capitalize(),
+            'full_name': f'{workspace}/{slug}',
+            'links': {'html': {'href': f'https://bitbucket.org/{workspace}/{slug}'},
+                      'clone': [{'name': 'https', 'href': f'https://bitbucket.org/{workspace}/{slug}.git'},
+                                {'name': 'ssh', 'href': f'git@bitbucket.org:{workspace}/{slug}.git'}],
+                      'forks': {'href': f'{api_root}/repositories/{workspace}/{slug}/forks'}}}
+
+
+def tree_uids(tree):
+    # reduces tree data to nested (uid, forks) pairs for comparison
+    return (node_uid(tree), [tree_uids(fork) for fork in tree['forks']])
+
+
+class ForgeTestCase(unittest.TestCase):
+    forge_name = None
+
+    def setUp(self):
+        self.mock = MockForge()
+        self.addCleanup(self.mock.close)
+        self.forge = init_forges(**{self.forge_name: mock_settings(self.mock)})[self.forge_name]
+
+    def assert_common_shape(self, api_package):
+        self.assertTrue(common_keys <= set(api_package), common_keys - set(api_package))
+        self.assertEqual(api_package['forge'], self.forge_name)
+
+
+class TestGitHub(ForgeTestCase):
+    forge_name = 'github'
+
+    def test_repo_and_paginated_forks(self):
+        api_root = self.mock.url
+        next_link = f'<{api_root}/repos/watabou/pixel-dungeon/forks?page=2>; rel="next"'
+        self.mock.routes = {
+            '/repos/watabou/pixel-dungeon': (github_repo(api_root, 'watabou', 'pixel-dungeon', 2), {}),
+            '/repos/watabou/pixel-dungeon/forks': ([github_repo(api_root, 'a', 'pixel-dungeon', 0)], {'Link': next_link}),
+            '/repos/watabou/pixel-dungeon/forks?page=2': ([github_repo(api_root, 'b', 'pixel-dungeon', 0)], {}),
+        }
+
+        api_package = self.forge.retrieve_repo('watabou', 'pixel-dungeon')
+        self.assert_common_shape(api_package)
+        self.assertEqual(node_uid({'api_package': api_package}), ('github', 'watabou', 'pixel-dungeon'))
+
+        # github clone folders are unchanged from before forge adapters existed
+        self.assertEqual(clone_folder_path({'api_package': api_package}), os.path.join('repos', 'watabou,pixel-dungeon'))
+
+        forks = self.forge.retrieve_repo_forks(api_package)
+        self.assertEqual([node_uid({'api_package': fork}) for fork in forks],
+                         [('github', 'a', 'pixel-dungeon'), ('github', 'b', 'pixel-dungeon')])
+        for fork in forks:
+            self.assert_common_shape(fork)
+
+    def test_rate_limit_headers(self):
+        self.assertEqual(self.forge.wait_time({}), 0)
+
+        # reset in the past falls back to the default
+        self.assertEqual(self.forge.wait_time({'X-RateLimit-Remaining': '10', 'X-RateLimit-Reset': '0'}), 0)
+
+        # reset in the future spreads the remaining requests over the time left
+        reset = int(time.time()) + 100
+        wait_time = self.forge.wait_time({'X-RateLimit-Remaining': '10', 'X-RateLimit-Reset': str(reset)})
+        self.assertAlmostEqual(wait_time, 1 + (reset - time.time()) / 10, delta=0.1)
+
+        # no remaining requests waits out the whole reset
+        wait_time = self.forge.wait_time({'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(reset)})
+        self.assertAlmostEqual(wait_time, 1 + (reset - time.time()), delta=0.1)
+
+
+class TestGitLab(ForgeTestCase):
+    forge_name = 'gitlab'
+
+    def test_repo_and_paginated_forks(self):
+        next_link = f'<{self.mock.url}/projects/1/forks?per_page=100&page=2>; rel="next"'
+        self.mock.routes = {
+            '/projects/RavenWolfPD%2Fnonameyetpixeldungeon': (gitlab_project(1, 'RavenWolfPD', 'nonameyetpixeldungeon', 2), {}),
+            '/projects/1/forks?per_page=100': ([gitlab_project(2, 'group/subgroup', 'nonameyetpixeldungeon', 0)], {'Link': next_link}),
+            '/projects/1/forks?per_page=100&page=2': ([gitlab_project(3, 'b', 'nonameyetpixeldungeon', 0)], {}),
+        }
+
+        api_package = self.forge.retrieve_repo('RavenWolfPD', 'nonameyetpixeldungeon')
+        self.assert_common_shape(api_package)
+        self.assertEqual(api_package['full_name'], 'RavenWolfPD/nonameyetpixeldungeon')
+        self.assertEqual(api_package['clone_url'], 'https://gitlab.com/RavenWolfPD/nonameyetpixeldungeon.git')
+        self.assertEqual(api_package['watchers_count'], 3)
+        self.assertEqual(api_package['forks_url'], f'{self.mock.url}/projects/1/forks?per_page=100')
+
+        forks = self.forge.retrieve_repo_forks(api_package)
+        self.assertEqual([node_uid({'api_package': fork}) for fork in forks],
+                         [('gitlab', 'group/subgroup', 'nonameyetpixeldungeon'), ('gitlab', 'b', 'nonameyetpixeldungeon')])
+        for fork in forks:
+            self.assert_common_shape(fork)
+
+        # non-github clone folders are prefixed by forge, and subgroup namespaces do not create nested folders
+        self.assertEqual(clone_folder_path({'api_package': forks[0]}), os.path.join('repos', 'gitlab,group+subgroup,nonameyetpixeldungeon'))
+
+    def test_rate_limit_headers(self):
+        self.assertEqual(self.forge.wait_time({'RateLimit-Remaining': '10', 'RateLimit-Reset': '0'}), 0)
+
+        reset = int(time.time()) + 100
+        wait_time = self.forge.wait_time({'RateLimit-Remaining': '4', 'RateLimit-Reset': str(reset)})
+        self.assertAlmostEqual(wait_time, 1 + (reset - time.time()) / 4, delta=0.1)
+
+        wait_time = self.forge.wait_time({'RateLimit-Remaining': '0', 'RateLimit-Reset': str(reset)})
+        self.assertAlmostEqual(wait_time, 1 + (reset - time.time()), delta=0.1)
+
+
+class TestBitbucket(ForgeTestCase):
+    forge_name = 'bitbucket'
+
+    def test_repo_and_paginated_forks(self):
+        api_root = self.mock.url
+        self.mock.routes = {
+            '/repositories/juh9870/moonshine': (bitbucket_repo(api_root, 'juh9870', 'moonshine'), {}),
+            '/repositories/juh9870/moonshine/forks?pagelen=100': (
+                {'values': [bitbucket_repo(api_root, 'a', 'moonshine')],
+                 'next': f'{api_root}/repositories/juh9870/moonshine/forks?pagelen=100&page=2'}, {}),
+            '/repositories/juh9870/moonshine/forks?pagelen=100&page=2': (
+                {'values': [bitbucket_repo(api_root, 'b', 'moonshine')]}, {}),
+        }
+
+        api_package = self.forge.retrieve_repo('juh9870', 'moonshine')
+        self.assert_common_shape(api_package)
+        self.assertEqual(api_package['name'], 'moonshine')
+        self.assertEqual(api_package['clone_url'], 'https://bitbucket.org/juh9870/moonshine.git')
+        self.assertIsNone(api_package['watchers_count'])
+        self.assertIsNone(api_package['forks_count'])
+
+        forks = self.forge.retrieve_repo_forks(api_package)
+        self.assertEqual([node_uid({'api_package': fork}) for fork in forks],
+                         [('bitbucket', 'a', 'moonshine'), ('bitbucket', 'b', 'moonshine')])
+        for fork in forks:
+            self.assert_common_shape(fork)
+
+    def test_no_rate_limit_headers(self):
+        self.assertEqual(self.forge.wait_time({}), 0)
+
+
+class TestCrawlNetwork(unittest.TestCase):
+    def setUp(self):
+        self.mocks = {}
+        for forge_name in ['github', 'gitlab', 'bitbucket']:
+            self.mocks[forge_name] = MockForge()
+            self.addCleanup(self.mocks[forge_name].close)
+
+        github_root = self.mocks['github'].url
+        self.mocks['github'].routes = {
+            '/repos/watabou/pixel-dungeon': (github_repo(github_root, 'watabou', 'pixel-dungeon', 1), {}),
+            '/repos/watabou/pixel-dungeon/forks': ([github_repo(github_root, 'ConsideredHamster', 'YetAnotherPixelDungeon', 0)], {}),
+            '/repos/00-Evan/shattered-pixel-dungeon': (github_repo(github_root, '00-Evan', 'shattered-pixel-dungeon', 0), {}),
+            '/repos/FthrNature/unleashed-pixel-dungeon': (github_repo(github_root, 'FthrNature', 'unleashed-pixel-dungeon', 0), {}),
+        }
+        self.mocks['gitlab'].routes = {
+            '/projects/RavenWolfPD%2Fnonameyetpixeldungeon': (gitlab_project(1, 'RavenWolfPD', 'nonameyetpixeldungeon', 0), {}),
+        }
+        bitbucket_root = self.mocks['bitbucket'].url
+        self.mocks['bitbucket'].routes = {
+            '/repositories/juh9870/moonshine': (bitbucket_repo(bitbucket_root, 'juh9870', 'moonshine'), {}),
+            '/repositories/juh9870/moonshine/forks?pagelen=100': ({'values': [bitbucket_repo(bitbucket_root, 'a', 'moonshine')]}, {}),
+            '/repositories/a/moonshine/forks?pagelen=100': ({'values': []}, {}),
+        }
+
+        self.root = ('github', 'watabou', 'pixel-dungeon')
+        self.links = [
+            ('github', '00-Evan', 'shattered-pixel-dungeon', 'github', 'watabou', 'pixel-dungeon'),
+            ('bitbucket', 'juh9870', 'moonshine', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+            ('gitlab', 'RavenWolfPD', 'nonameyetpixeldungeon', 'github', 'ConsideredHamster', 'YetAnotherPixelDungeon'),
+            ('github', 'FthrNature', 'unleashed-pixel-dungeon', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+            # duplicates, of an earlier link and of a fork already in the root tree
+            ('github', 'FthrNature', 'unleashed-pixel-dungeon', 'github', '00-Evan', 'shattered-pixel-dungeon'),
+            ('github', 'ConsideredHamster', 'YetAnotherPixelDungeon', 'github', 'watabou', 'pixel-dungeon'),
+        ]
+
+    def test_crawl_network(self):
+        forges = init_forges(**{forge_name: mock_settings(mock) for forge_name, mock in self.mocks.items()})
+        tree_data = establish_fork_list.crawl_network(forges, self.root, self.links)
+
+        self.assertEqual(tree_uids(tree_data),
+                         (('github', 'watabou', 'pixel-dungeon'), [
+                             (('github', 'ConsideredHamster', 'YetAnotherPixelDungeon'), [
+                                 (('gitlab', 'RavenWolfPD', 'nonameyetpixeldungeon'), []),
+                             ]),
+                             (('github', '00-Evan', 'shattered-pixel-dungeon'), [
+                                 (('bitbucket', 'juh9870', 'moonshine'), [
+                                     (('bitbucket', 'a', 'moonshine'), []),
+                                 ]),
+                                 (('github', 'FthrNature', 'unleashed-pixel-dungeon'), []),
+                             ]),
+                         ]))
+
+        # duplicate links are not retrieved again
+        self.assertEqual(self.mocks['github'].requested_paths.count('/repos/FthrNature/unleashed-pixel-dungeon'), 1)
+        self.assertNotIn('/repos/ConsideredHamster/YetAnotherPixelDungeon', self.mocks['github'].requested_paths)
+
+    def test_failing_forge_stops_crawl(self):
+        # github waits between requests, long enough to notice if the failure were only raised at the end
+        self.mocks['bitbucket'].routes = {}
+        settings = {forge_name: mock_settings(mock) for forge_name, mock in self.mocks.items()}
+        settings['github']['default_wait_time'] = 30
+        forges = init_forges(**settings)
+
+        start_time = time.time()
+        with self.assertRaises(AssertionError):
+            establish_fork_list.crawl_network(forges, self.root, self.links)
+        self.assertLess(time.time() - start_time, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,13 +6,22 @@ repos_folder = 'repos'
 
 
 def node_uid(node):
+    # trees crawled before forge adapters existed have no forge key, and are all from github
+    forge_name = node['api_package'].get('forge', 'github')
     user_name = node['api_package']['owner']['login']
     repo_name = node['api_package']['name']
-    return (user_name, repo_name)
+    return (forge_name, user_name, repo_name)
 
 
 def clone_folder_path(node):
-    name = ','.join(node_uid(node))
+    # github repos keep their original owner,repo folders, so clones made before forge adapters existed remain valid
+    # other forges are prefixed by forge name
+    # gitlab namespaces may contain slashes (subgroups), which must not create nested folders
+    forge_name, user_name, repo_name = node_uid(node)
+    if forge_name == 'github':
+        name = ','.join([user_name, repo_name])
+    else:
+        name = ','.join([forge_name, user_name, repo_name]).replace('/', '+')
     return os.path.join(repos_folder, name)
 
 